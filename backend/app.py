@@ -1,12 +1,46 @@
-from flask import Flask, render_template, send_from_directory, jsonify, request
+from flask import Flask, render_template, send_from_directory, jsonify, request, url_for
+import json
+import math
+import mimetypes
 import os
 import sqlite3
-import heapq
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
+from build_static import DIST_NAME, get_manifest_path
+from clustering import build_cluster_index
+from event_writer import INSERT_EVENT, EventWriter
+from polyline import cumulative_distances, encode_polyline, simplify
+from routing import Router, RoutingError
+
+# static_folder=None: static files go through `static_files` below, which also
+# serves the fingerprinted, precompressed builds from build_static.py
 app = Flask(__name__, 
             template_folder='../frontend/templates',
-            static_folder='../frontend/static')
+            static_folder=None)
 app.config['SECRET_KEY'] = 'pittfind-hackathon-2025'
+# Queue event inserts to a single group-committing writer thread (see event_writer.py)
+app.config['EVENT_WRITE_BEHIND'] = os.environ.get('PITTFIND_EVENT_WRITE_BEHIND') == '1'
+app.config['EVENT_WRITE_TIMEOUT'] = float(os.environ.get('PITTFIND_EVENT_WRITE_TIMEOUT', '10'))
+
+# Writer thread for write-behind event creation, started on first use in each process
+_event_writer = {'writer': None, 'lock': threading.Lock()}
+
+
+def get_event_writer(db):
+    with _event_writer['lock']:
+        if _event_writer['writer'] is None:
+            _event_writer['writer'] = EventWriter(db)
+    return _event_writer['writer']
+
+
+@app.route('/api/events/writer')
+def api_event_writer_stats():
+    """Write-behind queue metrics: queue depth, batch sizes and commit latency."""
+    writer = _event_writer['writer']
+    stats = writer.stats() if writer else {'running': False}
+    stats['enabled'] = app.config['EVENT_WRITE_BEHIND']
+    return jsonify(stats)
 
 # API endpoint to delete an event by id
 @app.route('/api/events/<int:event_id>', methods=['DELETE'])
@@ -18,8 +52,26 @@ def api_delete_event(event_id):
     cur = conn.cursor()
     cur.execute('DELETE FROM events WHERE id = ?', (event_id,))
     conn.commit()
+    if cur.rowcount:
+        clusters_event_deleted(event_id)
     conn.close()
     return jsonify({'success': True})
+
+def event_type_error(data):
+    """Return a message if an event field has the wrong type, else None.
+    Checked up front in write-behind mode so one bad row can't fail a batch."""
+    rowid = data['building_rowid']
+    if isinstance(rowid, bool) or not (isinstance(rowid, int) or (isinstance(rowid, str) and rowid.isdigit())):
+        return '`building_rowid` must be an integer rowid.'
+    for k in ('latitude', 'longitude'):
+        v = data[k]
+        if v is not None and (isinstance(v, bool) or not isinstance(v, (int, float)) or not math.isfinite(v)):
+            return f'`{k}` must be a number or null.'
+    for k in ('title', 'organization', 'description'):
+        if not isinstance(data[k], str):
+            return f'`{k}` must be a string.'
+    return None
+
 # API endpoint to create a new event
 @app.route('/api/events', methods=['POST'])
 def api_create_event():
@@ -27,25 +79,49 @@ def api_create_event():
     required = ['building_rowid', 'latitude', 'longitude', 'title', 'organization', 'description']
     if not all(k in data for k in required):
         return jsonify({'error': 'Missing required event fields.'}), 400
+    # batched inserts share a transaction, so reject rows that would fail it; the direct
+    # path keeps accepting whatever SQLite accepts
+    if app.config['EVENT_WRITE_BEHIND']:
+        err = event_type_error(data)
+        if err:
+            return jsonify({'error': err}), 400
     db = get_db_path()
     if not db:
         return jsonify({'error': 'Database not found.'}), 500
-    conn = sqlite3.connect(db)
-    cur = conn.cursor()
-    cur.execute('''
-        INSERT INTO events (building_rowid, latitude, longitude, title, organization, description)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (
+    values = (
         data['building_rowid'],
         data['latitude'],
         data['longitude'],
         data['title'],
         data['organization'],
         data['description']
-    ))
-    conn.commit()
-    event_id = cur.lastrowid
-    conn.close()
+    )
+    if app.config['EVENT_WRITE_BEHIND']:
+        future = get_event_writer(db).submit(values)
+        try:
+            try:
+                event_id = future.result(timeout=app.config['EVENT_WRITE_TIMEOUT'])
+            except FutureTimeoutError:
+                # cancelled entries are skipped by the writer, so a 503 means nothing was saved
+                if future.cancel():
+                    return jsonify({'error': 'Timed out waiting for the event to be saved.'}), 503
+                # the writer already picked it up, so give the insert one more bounded wait;
+                # a locked database can keep it retrying for much longer than that
+                try:
+                    event_id = future.result(timeout=app.config['EVENT_WRITE_TIMEOUT'])
+                except FutureTimeoutError:
+                    return jsonify({'error': 'Timed out waiting for the event to be saved; '
+                                             'it is still being written and may appear later.'}), 503
+        except sqlite3.Error as e:
+            return jsonify({'error': 'Failed to save event: ' + str(e)}), 500
+    else:
+        conn = sqlite3.connect(db)
+        cur = conn.cursor()
+        cur.execute(INSERT_EVENT, values)
+        conn.commit()
+        event_id = cur.lastrowid
+        conn.close()
+    clusters_event_added(db, event_id, data['building_rowid'], data['latitude'], data['longitude'])
     return jsonify({'success': True, 'event_id': event_id})
 
 @app.route('/')
@@ -53,10 +129,63 @@ def index():
     """Serve the main map page"""
     return render_template('map.html')
 
+# Asset manifest written by build_static.py, reloaded when the build is re-run
+_asset_manifest = {'mtime': None, 'assets': {}}
+
+
+def get_asset_manifest():
+    path = get_manifest_path()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime = None
+    if mtime != _asset_manifest['mtime']:
+        assets = {}
+        if mtime is not None:
+            try:
+                with open(path, encoding='utf-8') as fh:
+                    assets = json.load(fh)
+            except (OSError, ValueError) as e:
+                app.logger.warning('Ignoring asset manifest: %s', e)
+        _asset_manifest['assets'] = assets
+        _asset_manifest['mtime'] = mtime
+    return _asset_manifest['assets']
+
+
+@app.template_global()
+def asset_url(filename):
+    """URL of a static file, fingerprinted if build_static.py has been run."""
+    return url_for('static_files', filename=get_asset_manifest().get(filename, filename))
+
+
 @app.route('/static/<path:filename>')
 def static_files(filename):
     """Serve static files (CSS, JS, images)"""
-    return send_from_directory('../frontend/static', filename)
+    if not filename.startswith(DIST_NAME + '/'):
+        return send_from_directory('../frontend/static', filename)
+
+    # Send the smallest precompressed variant the client accepts. Fingerprinted files listed
+    # in the manifest never change under the same name, so they are cached forever; anything
+    # else in dist/ (manifest.json itself) is rewritten by every build.
+    fingerprinted = filename in set(get_asset_manifest().values())
+    static_dir = os.path.join(app.root_path, '../frontend/static')
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoding = None
+    for enc, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings[enc] and os.path.isfile(os.path.join(static_dir, filename + suffix)):
+            encoding = enc
+            filename += suffix
+            break
+    if fingerprinted:
+        response = send_from_directory('../frontend/static', filename, mimetype=mimetype, max_age=31536000)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    else:
+        response = send_from_directory('../frontend/static', filename, mimetype=mimetype)
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.content_encoding = encoding
+    return response
 
 @app.route('/health')
 def health_check():
@@ -98,59 +227,20 @@ def api_buildings():
     return jsonify(rows)
 
 
-def load_graph_from_db(conn):
-    """Load graph data from a `paths` table in the DB.
-    Expects columns: from_building_id, to_building_id, distance
-    Returns graph as adjacency dict keyed by rowid ints.
-    """
-    cur = conn.cursor()
-    # Ensure paths table exists
-    cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='paths'")
-    if not cur.fetchone():
-        return None, 'paths table not found'
-
-    # Build id -> neighbors graph
-    graph = {}
-    cur.execute('SELECT from_building_id, to_building_id, distance FROM paths')
-    for from_id, to_id, distance in cur.fetchall():
-        # use ints for keys
-        try:
-            f = int(from_id)
-            t = int(to_id)
-            d = float(distance)
-        except Exception:
-            continue
-
-        graph.setdefault(f, {})[t] = d
-        graph.setdefault(t, {})[f] = d
-
-    return graph, None
-
-
-def dijkstra_graph(graph, start, end):
-    # standard Dijkstra on graph keyed by node ids
-    queue = [(0, start, [start])]
-    visited = set()
-
-    while queue:
-        dist, node, path = heapq.heappop(queue)
-        if node == end:
-            return path, dist
-        if node in visited:
-            continue
-        visited.add(node)
-        for nbr, w in graph.get(node, {}).items():
-            if nbr not in visited:
-                heapq.heappush(queue, (dist + w, nbr, path + [nbr]))
-
-    return None, float('inf')
+# Shortest paths (see routing.py); graph data is loaded on the first query
+router = Router()
 
 
 @app.route('/api/pathfind')
 def api_pathfind():
     """Compute shortest path between two building ROWIDs.
-    Query params: start (rowid), end (rowid)
+    Query params: start (rowid), end (rowid),
+        fields (optional, comma separated building columns to return),
+        format (optional, `polyline` for compact geometry),
+        tolerance (optional, Douglas-Peucker tolerance in meters for `polyline`)
     Returns: { path: [building rows], distance: float }
+    With format=polyline: { polyline: encoded str, distances: [meters to each vertex],
+        buildings: [building rows per vertex, default fields id + Building_Name], distance: float }
     """
     start = request.args.get('start')
     end = request.args.get('end')
@@ -163,34 +253,75 @@ def api_pathfind():
     except ValueError:
         return jsonify({'error': 'start and end must be integer rowids'}), 400
 
+    fmt = request.args.get('format', 'full')
+    if fmt not in ('full', 'polyline'):
+        return jsonify({'error': '`format` must be `full` or `polyline`.'}), 400
+    try:
+        tolerance = float(request.args.get('tolerance', 0))
+    except ValueError:
+        return jsonify({'error': '`tolerance` must be a number of meters.'}), 400
+    if not math.isfinite(tolerance) or tolerance < 0:
+        return jsonify({'error': '`tolerance` must be a finite, non-negative number of meters.'}), 400
+
     db = get_db_path()
     conn = sqlite3.connect(db)
     conn.row_factory = sqlite3.Row
 
-    graph, err = load_graph_from_db(conn)
-    if graph is None:
-        conn.close()
-        return jsonify({'error': 'Path graph not available on server: ' + (err or '')}), 500
+    # Only select the building columns the client asked for
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip() and f.strip() != 'id']
+    if not fields and fmt == 'polyline':
+        fields = ['Building_Name']
+    if fields:
+        columns = {r[1] for r in conn.execute('PRAGMA table_info(buildings)')}
+        unknown = [f for f in fields if f not in columns]
+        if unknown:
+            conn.close()
+            return jsonify({'error': 'Unknown building fields: ' + ', '.join(unknown)}), 400
 
-    path_node_ids, total_dist = dijkstra_graph(graph, start_id, end_id)
+    try:
+        path_node_ids, total_dist = router.shortest_path(start_id, end_id, conn)
+    except RoutingError as e:
+        conn.close()
+        return jsonify({'error': str(e)}), 500
     if path_node_ids is None:
         conn.close()
         return jsonify({'error': 'No path found between requested nodes.'}), 404
 
-    # Fetch building rows for each node id in path
+    # Fetch building rows for every node id in path with a single query
     cur = conn.cursor()
-    buildings = []
-    for rid in path_node_ids:
-        cur.execute('SELECT rowid as id, * FROM buildings WHERE rowid = ?', (rid,))
-        r = cur.fetchone()
-        if r:
-            buildings.append(dict(r))
-        else:
-            # missing building row; include placeholder
-            buildings.append({'id': rid, 'name': None})
+    select = ', '.join('"%s"' % f for f in fields) if fields else '*'
+    ids = list(dict.fromkeys(path_node_ids))
+    placeholders = ', '.join('?' * len(ids))
+    cur.execute(f'SELECT rowid as id, {select} FROM buildings WHERE rowid IN ({placeholders})', ids)
+    rows = {r['id']: dict(r) for r in cur.fetchall()}
+    # missing building rows get a placeholder
+    buildings = [rows.get(rid, {'id': rid, 'name': None}) for rid in path_node_ids]
+
+    if fmt == 'full':
+        conn.close()
+        return jsonify({'path': buildings, 'distance': total_dist})
 
+    cur.execute(f'SELECT rowid, latitude, longitude FROM buildings WHERE rowid IN ({placeholders})', ids)
+    coords_by_id = {r[0]: (r[1], r[2]) for r in cur.fetchall() if r[1] is not None and r[2] is not None}
+    # distances follow the graph's edge weights so the last one matches `distance`
+    try:
+        distances = cumulative_distances(router.edge_lengths(path_node_ids, conn))
+    except RoutingError as e:
+        conn.close()
+        return jsonify({'error': str(e)}), 500
     conn.close()
-    return jsonify({'path': buildings, 'distance': total_dist})
+
+    # Vertices without coordinates can't be drawn, so they are left out of the geometry
+    vertices = [(b, coords_by_id[rid], d) for rid, b, d in zip(path_node_ids, buildings, distances)
+                if rid in coords_by_id]
+    coords = [c for _, c, _ in vertices]
+    keep = simplify(coords, tolerance)
+    return jsonify({
+        'polyline': encode_polyline([coords[i] for i in keep]),
+        'distances': [vertices[i][2] for i in keep],
+        'buildings': [vertices[i][0] for i in keep],
+        'distance': total_dist,
+    })
 
 
 @app.route('/api/events')
@@ -237,10 +368,109 @@ def api_events():
     conn.close()
     return jsonify(events)
 
+# Marker clusters per zoom level (see clustering.py). Built lazily, then kept current
+# by the event create/delete endpoints. The signature (events AUTOINCREMENT value,
+# row count) lets a worker notice writes made by other processes and rebuild.
+_cluster_cache = {'index': None}
+
+
+def events_signature(conn):
+    try:
+        seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name='events'").fetchone()
+        count = conn.execute('SELECT count(*) FROM events').fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return (seq[0] if seq else 0, count[0])
+
+
+def get_cluster_index(conn):
+    signature = events_signature(conn)
+    index = _cluster_cache['index']
+    if index is None or index.signature != signature:
+        index = build_cluster_index(conn)
+        index.signature = signature
+        _cluster_cache['index'] = index
+    return index
+
+
+def clusters_event_added(db, event_id, building_rowid, lat, lng):
+    index = _cluster_cache['index']
+    if index is None:
+        return
+    if lat is None or lng is None:
+        # same fallback as build_cluster_index: the event sits on its building
+        conn = sqlite3.connect(db)
+        row = conn.execute('SELECT latitude, longitude FROM buildings WHERE rowid = ?', (building_rowid,)).fetchone()
+        conn.close()
+        if row:
+            lat = row[0] if lat is None else lat
+            lng = row[1] if lng is None else lng
+    index.add('event', event_id, lat, lng)
+    # only advance the signature if this insert is the sole change since it was taken;
+    # otherwise leave it stale so the next read rebuilds
+    sig = index.signature
+    if sig is not None and sig[0] == event_id - 1:
+        index.signature = (event_id, sig[1] + 1)
+
+
+def clusters_event_deleted(event_id):
+    index = _cluster_cache['index']
+    if index is None:
+        return
+    index.remove('event', event_id)
+    sig = index.signature
+    if sig is not None:
+        index.signature = (sig[0], sig[1] - 1)
+
+
+@app.route('/api/clusters')
+def api_clusters():
+    """Return building and event marker clusters for a map view.
+    Query params: zoom (int), bbox (optional, `west,south,east,north` in degrees),
+    events (optional, `0` to leave events out of the clusters)
+    Returns: { zoom: int, clusters: [{ id, latitude, longitude, count, buildings, events, point? }] }
+    `point` identifies the building or event when a cluster has a single member.
+    """
+    try:
+        zoom = int(request.args.get('zoom', ''))
+    except ValueError:
+        return jsonify({'error': 'Provide an integer `zoom` query parameter.'}), 400
+    bbox = request.args.get('bbox')
+    if bbox:
+        try:
+            bbox = [float(v) for v in bbox.split(',')]
+        except ValueError:
+            bbox = None
+        if not bbox or len(bbox) != 4 or not all(math.isfinite(v) for v in bbox):
+            return jsonify({'error': '`bbox` must be west,south,east,north.'}), 400
+    else:
+        bbox = [-180.0, -85.0, 180.0, 85.0]
+    events = request.args.get('events', '1')
+    if events not in ('0', '1'):
+        return jsonify({'error': '`events` must be 0 or 1.'}), 400
+    kinds = ('building', 'event') if events == '1' else ('building',)
+
+    db = get_db_path()
+    if not db:
+        return jsonify({'error': 'Server database not found.'}), 500
+    conn = sqlite3.connect(db)
+    try:
+        index = get_cluster_index(conn)
+    except sqlite3.OperationalError:
+        conn.close()
+        return jsonify({'error': 'Database does not contain a `buildings` table.'}), 500
+    conn.close()
+
+    zoom, clusters = index.clusters(zoom, bbox, kinds)
+    return jsonify({'zoom': zoom, 'clusters': clusters})
+
 # Future API endpoints:
 # @app.route('/api/buildings')
 # @app.route('/api/events') 
 # @app.route('/api/pathfind')
 
+# Map the snapshot and hierarchy at import so pre-forked workers share the mappings
+router.preload()
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,128 @@
+"""
+Compute many routes at once, e.g. for nightly accessibility and coverage reports.
+
+Input is a CSV with `start` and `end` columns holding building rowids (extra columns are
+ignored). Pairs are spread over a process pool; each worker builds one Router and loads the
+graph once, and results are streamed to the output in input order as they complete.
+
+Usage:
+    python batch_routes.py pairs.csv                      # CSV to stdout
+    python batch_routes.py pairs.csv -o routes.jsonl      # format picked from the extension
+    python batch_routes.py pairs.csv -o out.txt --format csv --workers 8
+    python batch_routes.py pairs.csv --db other.db --snapshot other.snapshot
+
+Graph snapshots and hierarchy files built from a different database than --db are ignored,
+so routes always come from the database being queried.
+
+Output columns: start, end, distance, hops, path (rowids separated by spaces in CSV,
+a list in JSONL) and error (empty on success).
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+
+from routing import Router, RoutingError, get_db_path
+
+FIELDS = ['start', 'end', 'distance', 'hops', 'path', 'error']
+
+# per-process state, set up by _init_worker
+_worker = {}
+
+
+def read_pairs(csv_path):
+    with open(csv_path, newline='', encoding='utf-8') as fh:
+        for line_no, r in enumerate(csv.DictReader(fh), start=2):
+            yield line_no, r.get('start'), r.get('end')
+
+
+def _init_worker(db_path, snapshot_path=None):
+    _worker['router'] = Router(db_path=db_path, snapshot_path=snapshot_path, cache_graph=True)
+    _worker['conn'] = _worker['router'].connect()
+
+
+def route_pair(item):
+    line_no, start, end = item
+    result = {'start': start, 'end': end, 'distance': None, 'hops': None, 'path': None, 'error': ''}
+    try:
+        start_id = int(start)
+        end_id = int(end)
+    except (TypeError, ValueError):
+        result['error'] = f'line {line_no}: start and end must be integer rowids'
+        return result
+    result['start'], result['end'] = start_id, end_id
+    try:
+        path, dist = _worker['router'].shortest_path(start_id, end_id, _worker['conn'])
+    except RoutingError as e:
+        result['error'] = str(e)
+        return result
+    if path is None:
+        result['error'] = 'no path'
+        return result
+    result['distance'] = round(dist, 3)
+    result['hops'] = len(path) - 1
+    result['path'] = path
+    return result
+
+
+def write_results(results, out, fmt):
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(out, fieldnames=FIELDS)
+        writer.writeheader()
+        for r in results:
+            if r['path'] is not None:
+                r = dict(r, path=' '.join(str(n) for n in r['path']))
+            writer.writerow(r)
+            count += 1
+    else:
+        for r in results:
+            out.write(json.dumps(r) + '\n')
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compute shortest paths for start/end pairs from a CSV.')
+    parser.add_argument('pairs', help='CSV file with start,end columns (building rowids)')
+    parser.add_argument('-o', '--output', help='output file (default: stdout)')
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help='output format (default: from extension, else csv)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes')
+    parser.add_argument('--chunksize', type=int, default=64, help='pairs handed to a worker at a time')
+    parser.add_argument('--db', help='SQLite database (default: app.db next to this script)')
+    parser.add_argument('--snapshot', help='graph snapshot built from --db (default: paths.snapshot, used only if built from --db)')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.pairs):
+        print('CSV file not found:', args.pairs, file=sys.stderr)
+        sys.exit(2)
+    fmt = args.format
+    if not fmt:
+        fmt = 'jsonl' if args.output and args.output.endswith(('.jsonl', '.json')) else 'csv'
+
+    db_path = args.db or get_db_path()
+    if not db_path or not os.path.exists(db_path):
+        print('Database not found:', db_path or 'app.db', file=sys.stderr)
+        sys.exit(2)
+    out = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        if args.workers <= 1:
+            _init_worker(db_path, args.snapshot)
+            count = write_results(map(route_pair, read_pairs(args.pairs)), out, fmt)
+        else:
+            with multiprocessing.Pool(args.workers, initializer=_init_worker, initargs=(db_path, args.snapshot)) as pool:
+                results = pool.imap(route_pair, read_pairs(args.pairs), chunksize=args.chunksize)
+                count = write_results(results, out, fmt)
+    except RoutingError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f'Routed {count} pairs', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+"""
+Build fingerprinted, precompressed copies of the files under frontend/static.
+
+For every asset this writes frontend/static/dist/<dir>/<name>.<hash>.<ext>, where <hash> is
+taken from the (minified) content, plus `.gz` and `.br` variants for text formats. A manifest
+(dist/manifest.json) maps original paths such as `css/style.css` to their fingerprinted
+path; map.html looks URLs up through it, and app.py serves the fingerprinted files with far-future
+immutable cache headers, picking the precompressed variant from Accept-Encoding.
+
+Minification is deliberately conservative: CSS loses comments and redundant whitespace,
+JS loses indentation, blank lines and whole-line `//` comments (line breaks are kept so
+automatic semicolon insertion is unaffected). Lines inside multi-line template literals are
+kept exactly, and a JS file whose literals can't be followed is copied unminified.
+
+Brotli variants need the optional `brotli` package (pip install brotli); without it only
+gzip variants are written.
+
+Builds are additive: fingerprinted names never collide, so new files are written next to
+the old ones and manifest.json is swapped atomically. Pages rendered before a rebuild keep
+working because the files they reference are still there. Old fingerprints are only removed
+with --prune, which deletes every dist/ file the current manifest does not reference; run it
+once pages and caches from earlier builds have expired.
+
+Usage:
+    python build_static.py             # build and update the manifest
+    python build_static.py --prune     # also delete files from earlier builds
+
+Re-run after changing anything in frontend/static.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(__file__), '..', 'frontend', 'static')
+DIST_NAME = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# Formats worth compressing; images like png are already compressed
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.html', '.txt'}
+# Source-only files that the browser never loads
+SKIP = {'.jsx'}
+MIN_COMPRESS_SIZE = 256
+
+
+def get_dist_dir():
+    return os.path.join(STATIC_DIR, DIST_NAME)
+
+
+def get_manifest_path():
+    return os.path.join(get_dist_dir(), MANIFEST_NAME)
+
+
+def minify_css(text):
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,])\s*', r'\1', text)
+    text = text.replace(';}', '}')
+    return text.strip()
+
+
+# characters after which a `/` starts a regex literal rather than a division
+REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+REGEX_KEYWORDS = {'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete', 'void', 'throw'}
+
+
+def _js_line_starts(text):
+    """For each line of `text`, whether it starts inside a string, template or regex
+    literal. Also returns False as the second value if the literals could not be
+    followed (unterminated or a newline where none is allowed)."""
+    inside = [False]
+    templates = []    # brace depth inside each open template `${`
+    mode = None       # None for code, or one of ' " ` regex /* //
+    escaped = False
+    in_class = False  # inside [...] of a regex literal
+    prev = ''         # last non-space code character
+    i = 0
+    while i < len(text):
+        c = text[i]
+        two = text[i:i + 2]
+        if c == '\n':
+            if mode in ("'", '"', 'regex') and not escaped:
+                return inside, False
+            if mode == '//':
+                mode = None
+            inside.append(mode in ("'", '"', '`', 'regex'))
+            escaped = False
+        elif mode is None:
+            if two in ('//', '/*'):
+                mode = two
+                i += 2
+                continue
+            if c in '\'"`':
+                mode = c
+            elif c == '/':
+                word = re.search(r'(\w+)\s*$', text[max(0, i - 20):i])
+                if not prev or prev in REGEX_PRECEDERS or (word and word.group(1) in REGEX_KEYWORDS):
+                    mode = 'regex'
+                    in_class = False
+            elif c == '{' and templates:
+                templates[-1] += 1
+            elif c == '}' and templates:
+                if templates[-1] == 0:
+                    # end of a `${...}`: back inside the template literal
+                    templates.pop()
+                    mode = '`'
+                else:
+                    templates[-1] -= 1
+            if not c.isspace():
+                prev = c
+        elif mode == '/*':
+            if two == '*/':
+                mode = None
+                i += 2
+                continue
+        elif mode == '//':
+            pass
+        elif escaped:
+            escaped = False
+        elif c == '\\':
+            escaped = True
+        elif mode == 'regex':
+            if c == '[':
+                in_class = True
+            elif c == ']':
+                in_class = False
+            elif c == '/' and not in_class:
+                mode = None
+                prev = 'a'
+        elif mode == '`' and two == '${':
+            templates.append(0)
+            mode = None
+            prev = '{'
+            i += 2
+            continue
+        elif c == mode:
+            mode = None
+            prev = c
+        i += 1
+    return inside, mode in (None, '//') and not templates
+
+
+def minify_js(text):
+    starts, ok = _js_line_starts(text)
+    if not ok:
+        # couldn't follow the string literals; shipping it unminified is always safe
+        return text
+    lines = []
+    raw = text.split('\n')
+    for line, starts_inside, ends_inside in zip(raw, starts, starts[1:] + [False]):
+        if starts_inside:
+            # continuation of a multi-line template literal: whitespace and `//` are content
+            lines.append(line if ends_inside else line.rstrip())
+            continue
+        line = line.lstrip() if ends_inside else line.strip()
+        if not line or line.startswith('//'):
+            continue
+        lines.append(line)
+    return '\n'.join(lines) + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def iter_assets():
+    for root, dirs, files in os.walk(STATIC_DIR):
+        rel_root = os.path.relpath(root, STATIC_DIR)
+        if rel_root == '.':
+            dirs[:] = [d for d in dirs if d != DIST_NAME]
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in SKIP:
+                continue
+            rel = os.path.normpath(os.path.join(rel_root, name))
+            yield rel.replace(os.sep, '/')
+
+
+def write_atomic(path, data):
+    # readers see either nothing or the whole file, never a partial write
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+
+def build_asset(rel, dist):
+    src = os.path.join(STATIC_DIR, rel)
+    base, ext = os.path.splitext(rel)
+    ext = ext.lower()
+    with open(src, 'rb') as fh:
+        data = fh.read()
+    if ext in MINIFIERS:
+        data = MINIFIERS[ext](data.decode('utf-8')).encode('utf-8')
+
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    out_rel = f'{base}.{digest}{ext}'
+    out = os.path.join(dist, out_rel)
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    # same name means same content, so an existing file from an earlier build is reused
+    if not os.path.exists(out):
+        write_atomic(out, data)
+
+    sizes = {'original': os.path.getsize(src), 'minified': len(data)}
+    if ext in COMPRESSIBLE and len(data) >= MIN_COMPRESS_SIZE:
+        # mtime=0 keeps gzip output identical across builds
+        gz = gzip.compress(data, compresslevel=9, mtime=0)
+        write_atomic(out + '.gz', gz)
+        sizes['gzip'] = len(gz)
+        if brotli is not None:
+            br = brotli.compress(data, quality=11)
+            write_atomic(out + '.br', br)
+            sizes['br'] = len(br)
+    return f'{DIST_NAME}/{out_rel}', sizes
+
+
+def prune(dist, manifest):
+    """Delete files under dist/ that the manifest does not reference (including their
+    .gz/.br variants). Returns the number of files removed."""
+    keep = {MANIFEST_NAME}
+    for out_rel in manifest.values():
+        rel = out_rel[len(DIST_NAME) + 1:]
+        keep.update((rel, rel + '.gz', rel + '.br'))
+    removed = 0
+    for root, dirs, files in os.walk(dist):
+        for name in files:
+            rel = os.path.relpath(os.path.join(root, name), dist).replace(os.sep, '/')
+            if rel not in keep:
+                os.remove(os.path.join(root, name))
+                removed += 1
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build fingerprinted, precompressed static assets.')
+    parser.add_argument('--prune', action='store_true', help='delete dist/ files not in the new manifest')
+    args = parser.parse_args()
+
+    dist = get_dist_dir()
+    os.makedirs(dist, exist_ok=True)
+
+    manifest = {}
+    for rel in iter_assets():
+        out_rel, sizes = build_asset(rel, dist)
+        manifest[rel] = out_rel
+        print(rel, '->', out_rel, ' '.join(f'{k}={v}' for k, v in sizes.items()))
+
+    # swap the manifest only after every file it points at exists
+    data = json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8')
+    write_atomic(get_manifest_path(), data)
+    if brotli is None:
+        print('brotli not installed; wrote gzip variants only')
+    print(f'Wrote {len(manifest)} assets and {get_manifest_path()}')
+    if args.prune:
+        print(f'Pruned {prune(dist, manifest)} files from earlier builds')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+Hierarchical marker clusters for the map, one level per zoom.
+
+Points (buildings and events) are projected to Web Mercator and bucketed into a grid per
+zoom level whose cells are CLUSTER_RADIUS screen pixels wide at that zoom, similar to how
+supercluster groups markers. Each cell keeps a count and coordinate sums per point kind,
+so a cluster's centroid is the mean of its members, also when a kind is filtered out.
+
+Because a point only touches one cell per zoom, adding or removing an event is
+O(number of zoom levels) and the index never has to be rebuilt while the server runs.
+"""
+import math
+import threading
+
+MIN_ZOOM = 0
+MAX_ZOOM = 18
+CLUSTER_RADIUS = 60   # pixels
+TILE_SIZE = 256
+
+
+def project(lat, lng):
+    """Project to Web Mercator in the unit square (x to the east, y to the south)."""
+    x = lng / 360.0 + 0.5
+    s = math.sin(math.radians(max(-85.05112878, min(85.05112878, lat))))
+    y = 0.5 - 0.25 * math.log((1 + s) / (1 - s)) / math.pi
+    return x, y
+
+
+def unproject(x, y):
+    lng = (x - 0.5) * 360.0
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y))))
+    return lat, lng
+
+
+class ClusterIndex:
+    """Grid clusters for every zoom level with incremental add/remove."""
+
+    def __init__(self, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM, radius=CLUSTER_RADIUS):
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.cell_size = {z: radius / (TILE_SIZE * 2 ** z) for z in range(min_zoom, max_zoom + 1)}
+        # zoom -> {(cx, cy): cell}, cell = {kind: [count, sum_x, sum_y, {point keys}]}
+        self.levels = {z: {} for z in self.cell_size}
+        # (kind, id) -> (x, y)
+        self.points = {}
+        self.lock = threading.Lock()
+        # opaque marker of the data the index reflects, set by the owner
+        self.signature = None
+
+    def __len__(self):
+        return len(self.points)
+
+    def _cell_key(self, z, x, y):
+        size = self.cell_size[z]
+        return int(x // size), int(y // size)
+
+    def add(self, kind, point_id, lat, lng):
+        try:
+            lat = float(lat)
+            lng = float(lng)
+        except (TypeError, ValueError):
+            return False
+        key = (kind, point_id)
+        with self.lock:
+            if key in self.points:
+                self._remove(key)
+            x, y = project(lat, lng)
+            self.points[key] = (x, y)
+            for z, cells in self.levels.items():
+                cell = cells.setdefault(self._cell_key(z, x, y), {})
+                part = cell.setdefault(kind, [0, 0.0, 0.0, set()])
+                part[0] += 1
+                part[1] += x
+                part[2] += y
+                part[3].add(key)
+        return True
+
+    def remove(self, kind, point_id):
+        with self.lock:
+            return self._remove((kind, point_id))
+
+    def _remove(self, key):
+        if key not in self.points:
+            return False
+        x, y = self.points.pop(key)
+        kind = key[0]
+        for z, cells in self.levels.items():
+            ck = self._cell_key(z, x, y)
+            cell = cells[ck]
+            part = cell[kind]
+            part[0] -= 1
+            part[1] -= x
+            part[2] -= y
+            part[3].discard(key)
+            if part[0] == 0:
+                del cell[kind]
+                if not cell:
+                    del cells[ck]
+        return True
+
+    def clusters(self, zoom, bbox, kinds=('building', 'event')):
+        """Return clusters at `zoom` whose cells intersect bbox (west, south, east, north),
+        counting only points of the given kinds."""
+        z = max(self.min_zoom, min(self.max_zoom, int(zoom)))
+        west, south, east, north = bbox
+        x0, y0 = project(north, west)
+        x1, y1 = project(south, east)
+        size = self.cell_size[z]
+        cx0, cy0, cx1, cy1 = int(x0 // size), int(y0 // size), int(x1 // size), int(y1 // size)
+
+        out = []
+        with self.lock:
+            cells = self.levels[z]
+            # walk whichever is smaller: the bbox cell range or the occupied cells
+            if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) <= len(cells):
+                keys = ((cx, cy) for cx in range(cx0, cx1 + 1) for cy in range(cy0, cy1 + 1))
+                found = ((k, cells.get(k)) for k in keys)
+            else:
+                found = ((k, c) for k, c in cells.items()
+                         if cx0 <= k[0] <= cx1 and cy0 <= k[1] <= cy1)
+            for (cx, cy), cell in found:
+                if cell is None:
+                    continue
+                parts = [cell[k] for k in kinds if k in cell]
+                count = sum(p[0] for p in parts)
+                if not count:
+                    continue
+                lat, lng = unproject(sum(p[1] for p in parts) / count, sum(p[2] for p in parts) / count)
+                item = {
+                    'id': f'{z}/{cx}/{cy}',
+                    'latitude': round(lat, 7),
+                    'longitude': round(lng, 7),
+                    'count': count,
+                    'buildings': cell['building'][0] if 'building' in kinds and 'building' in cell else 0,
+                    'events': cell['event'][0] if 'event' in kinds and 'event' in cell else 0,
+                }
+                if count == 1:
+                    kind, point_id = next(iter(parts[0][3]))
+                    item['point'] = {'type': kind, 'id': point_id}
+                out.append(item)
+        return z, out
+
+
+def build_cluster_index(conn):
+    """Build an index from the `buildings` table and the current `events`."""
+    index = ClusterIndex()
+    for rowid, lat, lng in conn.execute('SELECT rowid, latitude, longitude FROM buildings'):
+        index.add('building', rowid, lat, lng)
+    has_events = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='events'").fetchone()
+    if has_events:
+        # events without their own coordinates sit on their building
+        rows = conn.execute('''
+            SELECT e.id, COALESCE(e.latitude, b.latitude), COALESCE(e.longitude, b.longitude)
+            FROM events e LEFT JOIN buildings b ON b.rowid = e.building_rowid
+        ''')
+        for event_id, lat, lng in rows:
+            index.add('event', event_id, lat, lng)
+    return index
@@ -0,0 +1,435 @@
+"""
+Build a contraction hierarchy (CH) over the `paths` graph so `/api/pathfind` can answer
+route queries by searching only a small "upward" part of the graph.
+
+Preprocessing contracts nodes one at a time in order of importance (edge difference plus
+number of already contracted neighbours). Whenever removing a node would break a shortest
+path between two of its neighbours, a shortcut edge is added that remembers the node it
+skips over, so query results can be unpacked back into the original building sequence.
+
+The result is stored in the backend database next to `paths`:
+
+    ch_nodes(node_id, rank)                       -- contraction order
+    ch_edges(from_id, to_id, distance, via_id)    -- upward edges, via_id NULL for originals
+    ch_meta(key, value)                           -- build timestamp and stats
+
+The upward edges are also written to `paths.ch` in the graph snapshot format (see
+graph_snapshot.py), tagged with the same build timestamp. The server maps that file, so
+workers share one copy of the hierarchy and load it without scanning `ch_edges`; the tables
+are the fallback when the file is missing or belongs to another build.
+
+Usage:
+    python contraction_hierarchy.py              # (re)build the hierarchy
+    python contraction_hierarchy.py --benchmark 500
+                                                 # build, then compare against plain Dijkstra
+
+generate_paths_from_coords.py and load_paths.py drop the stored hierarchy when they change
+`paths`, so routing falls back to Dijkstra until this is re-run; the server picks up the new
+hierarchy on the next query.
+"""
+import heapq
+import os
+import random
+import sqlite3
+import sys
+import time
+
+from graph_snapshot import db_source, load_snapshot, read_paths_graph, write_snapshot
+
+
+def get_db_path():
+    return os.path.join(os.path.dirname(__file__), 'app.db')
+
+
+def get_hierarchy_path():
+    return os.path.join(os.path.dirname(__file__), 'paths.ch')
+
+
+def _witness_distances(adj, source, skip, targets, limit, max_settled=500):
+    """Bounded Dijkstra from `source` that never passes through `skip`.
+    Stops once every target is settled, the search radius exceeds `limit`
+    or `max_settled` nodes have been settled. Returns distances found so far.
+    """
+    dist = {source: 0.0}
+    queue = [(0.0, source)]
+    settled = 0
+    remaining = set(targets)
+    while queue and remaining:
+        d, node = heapq.heappop(queue)
+        if d > dist.get(node, float('inf')):
+            continue
+        if d > limit:
+            break
+        remaining.discard(node)
+        settled += 1
+        if settled > max_settled:
+            break
+        for nbr, w in adj[node].items():
+            if nbr == skip:
+                continue
+            nd = d + w
+            if nd < dist.get(nbr, float('inf')):
+                dist[nbr] = nd
+                heapq.heappush(queue, (nd, nbr))
+    return dist
+
+
+def _needed_shortcuts(adj, node):
+    """Return the (u, w, distance) shortcuts required to contract `node`."""
+    nbrs = list(adj[node].items())
+    shortcuts = []
+    for i, (u, du) in enumerate(nbrs):
+        # pairs not covered by a direct edge need a witness search from u
+        pending = {}
+        for w, dw in nbrs[i + 1:]:
+            via = du + dw
+            if adj[u].get(w, float('inf')) > via:
+                pending[w] = via
+        if not pending:
+            continue
+        dist = _witness_distances(adj, u, node, pending, max(pending.values()))
+        for w, via in pending.items():
+            if dist.get(w, float('inf')) > via:
+                shortcuts.append((u, w, via))
+    return shortcuts
+
+
+def _priority(adj, node, contracted_nbrs):
+    shortcuts = _needed_shortcuts(adj, node)
+    return len(shortcuts) - len(adj[node]) + contracted_nbrs.get(node, 0), shortcuts
+
+
+def build_contraction_hierarchy(graph):
+    """Contract every node of `graph` (adjacency dict, undirected).
+
+    Returns (rank, edges) where rank maps node id -> contraction order and edges maps
+    (low_rank_node, high_rank_node) -> (distance, via) for every upward edge. `via` is
+    the contracted middle node for shortcuts and None for original edges.
+    """
+    # working copy: node -> {nbr: distance}, without self-loops; middle node per shortcut pair
+    adj = {n: {m: d for m, d in nbrs.items() if m != n} for n, nbrs in graph.items()}
+    via = {}
+    rank = {}
+    edges = {}
+    contracted_nbrs = {}
+
+    queue = []
+    for n in adj:
+        prio, _ = _priority(adj, n, contracted_nbrs)
+        heapq.heappush(queue, (prio, n))
+
+    while queue:
+        prio, node = heapq.heappop(queue)
+        if node in rank:
+            continue
+        # lazy update: recompute and re-queue if the node is no longer the cheapest
+        prio, shortcuts = _priority(adj, node, contracted_nbrs)
+        if queue and prio > queue[0][0]:
+            heapq.heappush(queue, (prio, node))
+            continue
+
+        rank[node] = len(rank)
+        for nbr, d in adj[node].items():
+            key = (node, nbr) if node < nbr else (nbr, node)
+            edges[(node, nbr)] = (d, via.get(key))
+            del adj[nbr][node]
+            contracted_nbrs[nbr] = contracted_nbrs.get(nbr, 0) + 1
+        del adj[node]
+
+        for u, w, d in shortcuts:
+            if d < adj[u].get(w, float('inf')):
+                adj[u][w] = d
+                adj[w][u] = d
+                via[(u, w) if u < w else (w, u)] = node
+
+    return rank, edges
+
+
+def create_ch_tables(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS ch_nodes (
+        node_id INTEGER PRIMARY KEY,
+        rank INTEGER NOT NULL
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS ch_edges (
+        from_id INTEGER NOT NULL,
+        to_id INTEGER NOT NULL,
+        distance REAL NOT NULL,
+        via_id INTEGER
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS ch_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )
+    ''')
+    conn.commit()
+
+
+def write_hierarchy_file(rank, edges, built_at, source_db, path=None):
+    """Write the upward edges to the mapped hierarchy file, tagged with `built_at` and
+    the database they were built from."""
+    upward = {n: {} for n in rank}
+    via = {}
+    for (f, t), (d, v) in edges.items():
+        upward[f][t] = d
+        via[(f, t)] = v
+    meta = {'built_at': built_at, 'source_db': source_db}
+    return write_snapshot(upward, path or get_hierarchy_path(), via=via, meta=meta)
+
+
+def save_contraction_hierarchy(conn, rank, edges, stats=None, built_at=None):
+    create_ch_tables(conn)
+    cur = conn.cursor()
+    cur.execute('DELETE FROM ch_nodes')
+    cur.execute('DELETE FROM ch_edges')
+    cur.execute('DELETE FROM ch_meta')
+    cur.executemany('INSERT INTO ch_nodes(node_id, rank) VALUES (?, ?)', rank.items())
+    cur.executemany('INSERT INTO ch_edges(from_id, to_id, distance, via_id) VALUES (?, ?, ?, ?)',
+                    [(f, t, d, v) for (f, t), (d, v) in edges.items()])
+    meta = {'built_at': built_at or repr(time.time())}
+    meta.update({k: str(v) for k, v in (stats or {}).items()})
+    cur.executemany('INSERT INTO ch_meta(key, value) VALUES (?, ?)', meta.items())
+    conn.commit()
+
+
+def clear_contraction_hierarchy(conn):
+    """Drop the stored hierarchy so routing falls back to the current `paths`.
+    Called whenever `paths` changes; re-run this script to rebuild."""
+    for table in ('ch_meta', 'ch_edges', 'ch_nodes'):
+        conn.execute(f'DROP TABLE IF EXISTS {table}')
+    conn.commit()
+    try:
+        os.remove(get_hierarchy_path())
+    except FileNotFoundError:
+        pass
+
+
+def ch_version(conn):
+    """Return the build stamp of the stored hierarchy, or None if there is none."""
+    try:
+        row = conn.execute("SELECT value FROM ch_meta WHERE key = 'built_at'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+class UpwardEdges(dict):
+    """In-memory upward graph read from the ch_* tables, with the same `via` lookup
+    as a mapped SnapshotGraph."""
+
+    def __init__(self):
+        super().__init__()
+        self.vias = {}
+
+    def via(self, node, nbr):
+        return self.vias[(node, nbr)]
+
+
+class ContractionHierarchy:
+    """Query engine over a stored hierarchy: bidirectional Dijkstra on upward edges."""
+
+    def __init__(self, upward, version=None):
+        # upward: node -> {higher ranked nbr: distance}, with the middle node of each
+        # shortcut from upward.via(node, nbr); a mapped SnapshotGraph or an UpwardEdges
+        self.upward = upward
+        self.version = version
+
+    @classmethod
+    def load(cls, conn):
+        """Read the hierarchy from the ch_* tables into this process."""
+        version = ch_version(conn)
+        if version is None:
+            return None
+        upward = UpwardEdges()
+        for f, t, d, v in conn.execute('SELECT from_id, to_id, distance, via_id FROM ch_edges'):
+            upward.setdefault(f, {})[t] = d
+            upward.vias[(f, t)] = v
+        for (node_id,) in conn.execute('SELECT node_id FROM ch_nodes'):
+            upward.setdefault(node_id, {})
+        return cls(upward, version)
+
+    @classmethod
+    def load_file(cls, version, source_db, path=None):
+        """Map the hierarchy file if it was written from `source_db` by the build stamped
+        `version`. Returns (hierarchy, error); hierarchy is None if the file is missing,
+        stale or from another database."""
+        graph, err = load_snapshot(path or get_hierarchy_path(), source_db)
+        if graph is None:
+            return None, err
+        if graph.meta.get('built_at') != version:
+            graph.close()
+            return None, 'hierarchy file is from another build'
+        return cls(graph, version), None
+
+    def __contains__(self, node):
+        return node in self.upward
+
+    def edge_weight(self, a, b):
+        """Length of the upward edge between a and b, in whichever direction it is stored."""
+        nbrs = self.upward.get(a)
+        if nbrs and b in nbrs:
+            return nbrs[b]
+        return self.upward[b][a]
+
+    def _unpack(self, u, w, out):
+        # append the original nodes between u (exclusive) and w (inclusive)
+        stack = [(u, w)]
+        while stack:
+            a, b = stack.pop()
+            # upward edges run from the lower to the higher ranked end
+            try:
+                mid = self.upward.via(a, b)
+            except KeyError:
+                mid = self.upward.via(b, a)
+            if mid is None:
+                out.append(b)
+            else:
+                stack.append((mid, b))
+                stack.append((a, mid))
+
+    def query(self, start, end):
+        """Return (path, distance) like `dijkstra_graph`, or (None, inf) if unreachable."""
+        if start not in self.upward or end not in self.upward:
+            return None, float('inf')
+        if start == end:
+            return [start], 0.0
+
+        dist = ({start: 0.0}, {end: 0.0})
+        parent = ({start: None}, {end: None})
+        queues = ([(0.0, start)], [(0.0, end)])
+        done = (set(), set())
+        best = float('inf')
+        meet = None
+
+        while queues[0] or queues[1]:
+            # alternate directions, always expanding the side with the smaller key
+            if not queues[1] or (queues[0] and queues[0][0][0] <= queues[1][0][0]):
+                side = 0
+            else:
+                side = 1
+            d, node = heapq.heappop(queues[side])
+            if d >= best:
+                # nothing left on this side can improve the best meeting point
+                queues[side].clear()
+                continue
+            if node in done[side]:
+                continue
+            done[side].add(node)
+            other = dist[1 - side].get(node)
+            if other is not None and d + other < best:
+                best = d + other
+                meet = node
+            for nbr, w in self.upward[node].items():
+                nd = d + w
+                if nd < dist[side].get(nbr, float('inf')):
+                    dist[side][nbr] = nd
+                    parent[side][nbr] = node
+                    heapq.heappush(queues[side], (nd, nbr))
+
+        if meet is None:
+            return None, float('inf')
+
+        up = [meet]
+        while parent[0][up[-1]] is not None:
+            up.append(parent[0][up[-1]])
+        up.reverse()
+        down = [meet]
+        while parent[1][down[-1]] is not None:
+            down.append(parent[1][down[-1]])
+
+        hops = up + down[1:]
+        path = [hops[0]]
+        for a, b in zip(hops, hops[1:]):
+            self._unpack(a, b, path)
+        return path, best
+
+
+def benchmark(conn, graph, ch, queries, build_seconds):
+    from routing import dijkstra_graph
+
+    nodes = list(graph)
+    rng = random.Random(0)
+    pairs = [(rng.choice(nodes), rng.choice(nodes)) for _ in range(queries)]
+
+    t0 = time.perf_counter()
+    expected = [dijkstra_graph(graph, s, e) for s, e in pairs]
+    dijkstra_seconds = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    got = [ch.query(s, e) for s, e in pairs]
+    ch_seconds = time.perf_counter() - t0
+
+    mismatches = sum(1 for (_, a), (_, b) in zip(expected, got) if abs(a - b) > 1e-6)
+
+    original_edges = sum(len(n) for n in graph.values()) // 2
+    shortcut_edges = sum(1 for n in ch.upward for nbr in ch.upward[n] if ch.upward.via(n, nbr) is not None)
+    storage = {}
+    try:
+        for name in ('paths', 'ch_nodes', 'ch_edges'):
+            row = conn.execute('SELECT sum(pgsize) FROM dbstat WHERE name = ?', (name,)).fetchone()
+            storage[name] = row[0]
+    except sqlite3.OperationalError:
+        storage = {}  # dbstat not compiled into this sqlite build
+    storage['paths.ch'] = os.path.getsize(get_hierarchy_path())
+
+    print(f'nodes: {len(graph)}  original edges: {original_edges}  shortcuts: {shortcut_edges}')
+    print(f'preprocessing: {build_seconds:.3f}s')
+    print(f'queries: {queries}  distance mismatches: {mismatches}')
+    print(f'dijkstra: {dijkstra_seconds / queries * 1000:.3f} ms/query')
+    print(f'ch:       {ch_seconds / queries * 1000:.3f} ms/query')
+    if storage:
+        print('storage bytes: ' + ', '.join(f'{k}={v}' for k, v in storage.items()))
+
+
+def main():
+    args = sys.argv[1:]
+    queries = 0
+    if args[:1] == ['--benchmark']:
+        queries = int(args[1]) if len(args) > 1 else 500
+
+    db = get_db_path()
+    conn = sqlite3.connect(db)
+    cur = conn.cursor()
+    cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='paths'")
+    if not cur.fetchone():
+        print('paths table not found. Run generate_paths_from_coords.py or load_paths.py first.')
+        conn.close()
+        return
+
+    graph = read_paths_graph(conn)
+    if not graph:
+        print('paths table is empty. Nothing to contract.')
+        conn.close()
+        return
+
+    t0 = time.perf_counter()
+    rank, edges = build_contraction_hierarchy(graph)
+    build_seconds = time.perf_counter() - t0
+    shortcut_count = sum(1 for _, v in edges.values() if v is not None)
+    # write the file first: the server only looks for it once ch_meta carries the new stamp
+    built_at = repr(time.time())
+    write_hierarchy_file(rank, edges, built_at, db_source(conn))
+    save_contraction_hierarchy(conn, rank, edges, built_at=built_at, stats={
+        'nodes': len(rank),
+        'edges': len(edges),
+        'shortcuts': shortcut_count,
+        'build_seconds': round(build_seconds, 3),
+    })
+    print(f'Contracted {len(rank)} nodes in {build_seconds:.2f}s: '
+          f'{len(edges)} upward edges ({shortcut_count} shortcuts)')
+
+    if queries:
+        ch, err = ContractionHierarchy.load_file(built_at, db_source(conn))
+        if ch is None:
+            print('Could not map the hierarchy file:', err)
+        else:
+            benchmark(conn, graph, ch, queries, build_seconds)
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
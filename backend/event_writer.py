@@ -0,0 +1,144 @@
+"""
+Write-behind queue for event creation.
+
+Instead of every request opening its own connection and committing (and fsyncing) one
+row, requests hand validated events to a single writer thread. The writer waits up to
+`max_delay` seconds after the first queued event for more to arrive, inserts up to
+`max_batch` of them in one transaction and resolves each request's future with its id.
+If the batch fails it is rolled back and retried one row at a time, so only the bad row's
+request sees the error. A request that times out cancels its future; the writer skips
+cancelled entries, so a timed-out event is never written after the client got a 503.
+One writer also means requests no longer contend for SQLite's write lock.
+
+Enabled in app.py with PITTFIND_EVENT_WRITE_BEHIND=1.
+"""
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+INSERT_EVENT = '''
+    INSERT INTO events (building_rowid, latitude, longitude, title, organization, description)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+
+class EventWriter:
+    """Single background thread that group-commits queued event inserts."""
+
+    def __init__(self, db_path, max_batch=100, max_delay=0.005):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'events_written': 0,
+            'events_failed': 0,
+            'events_cancelled': 0,
+            'batches': 0,
+            'batch_retries': 0,
+            'last_batch_size': 0,
+            'max_batch_size': 0,
+            'last_commit_ms': 0.0,
+            'max_commit_ms': 0.0,
+            'total_commit_ms': 0.0,
+            'total_batched': 0,
+        }
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='event-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, values):
+        """Queue one event (a tuple matching INSERT_EVENT) and return a Future for its id."""
+        self.start()
+        future = Future()
+        self._queue.put((values, future))
+        return future
+
+    def stats(self):
+        with self._stats_lock:
+            s = dict(self._stats)
+        total = s.pop('total_commit_ms')
+        batched = s.pop('total_batched')
+        s['avg_batch_size'] = round(batched / s['batches'], 2) if s['batches'] else 0.0
+        s['avg_commit_ms'] = round(total / s['batches'], 3) if s['batches'] else 0.0
+        s['queue_depth'] = self._queue.qsize()
+        s['running'] = self._thread is not None and self._thread.is_alive()
+        return s
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        while True:
+            batch = self._next_batch()
+            # skip entries whose request timed out and cancelled them; the rest can no
+            # longer be cancelled, so their requests will wait for the result
+            live = [(values, future) for values, future in batch if future.set_running_or_notify_cancel()]
+            if len(live) < len(batch):
+                with self._stats_lock:
+                    self._stats['events_cancelled'] += len(batch) - len(live)
+            batch = live
+            if not batch:
+                continue
+            t0 = time.perf_counter()
+            ids = []
+            try:
+                cur = conn.cursor()
+                for values, _ in batch:
+                    cur.execute(INSERT_EVENT, values)
+                    ids.append(cur.lastrowid)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                self._write_one_by_one(conn, batch)
+                continue
+            commit_ms = (time.perf_counter() - t0) * 1000
+
+            for (_, future), event_id in zip(batch, ids):
+                future.set_result(event_id)
+            with self._stats_lock:
+                s = self._stats
+                s['events_written'] += len(batch)
+                s['total_batched'] += len(batch)
+                s['batches'] += 1
+                s['last_batch_size'] = len(batch)
+                s['max_batch_size'] = max(s['max_batch_size'], len(batch))
+                s['last_commit_ms'] = round(commit_ms, 3)
+                s['max_commit_ms'] = max(s['max_commit_ms'], round(commit_ms, 3))
+                s['total_commit_ms'] += commit_ms
+
+    def _write_one_by_one(self, conn, batch):
+        # a failed batch is retried row by row so only the bad row's request fails
+        written = failed = 0
+        for values, future in batch:
+            try:
+                cur = conn.execute(INSERT_EVENT, values)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                future.set_exception(e)
+                failed += 1
+                continue
+            future.set_result(cur.lastrowid)
+            written += 1
+        with self._stats_lock:
+            self._stats['events_written'] += written
+            self._stats['events_failed'] += failed
+            self._stats['batch_retries'] += 1
@@ -8,11 +8,16 @@ Usage:
 This will create a `paths` table and insert bidirectional edges between all pairs (or a subset)
 -- for a small campus dataset this is acceptable. For larger datasets you may want to limit to
 nearest neighbors only.
+
+The binary graph snapshot (`paths.snapshot`, see graph_snapshot.py) is rewritten afterwards.
 """
 import sqlite3
 import os
 import math
 
+from contraction_hierarchy import clear_contraction_hierarchy
+from graph_snapshot import write_snapshot_from_db
+
 
 def get_db_path():
     return os.path.join(os.path.dirname(__file__), 'app.db')
@@ -85,6 +90,14 @@ def main():
     cur.executemany('INSERT INTO paths(from_building_id, to_building_id, distance) VALUES (?, ?, ?)', edges)
     conn.commit()
     print(f'Inserted {len(edges)} path edges into database')
+
+    # Refresh the binary snapshot the backend maps at startup
+    nodes, snapshot_edges = write_snapshot_from_db(conn)
+    print(f'Wrote graph snapshot ({nodes} nodes, {snapshot_edges} edges)')
+
+    # The stored contraction hierarchy describes the old paths; drop it so it isn't used
+    clear_contraction_hierarchy(conn)
+    print('Cleared contraction hierarchy; run contraction_hierarchy.py to rebuild it')
     conn.close()
 
 
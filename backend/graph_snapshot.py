@@ -0,0 +1,271 @@
+"""
+Binary snapshot of the `paths` graph that the backend can `mmap` instead of scanning SQLite.
+
+The path-generation scripts (generate_paths_from_coords.py, load_paths.py) write the snapshot
+after updating `paths`. Every worker process maps the same file read-only, so the graph lives
+once in the OS page cache instead of once per process, and startup needs no SQLite query.
+contraction_hierarchy.py writes its upward graph in the same format (`paths.ch`), with a
+`via` section for unpacking shortcuts.
+
+File layout (little-endian, every section 8-byte aligned):
+
+    header   magic b'PITTGRPH', version u32, crc32 u32, node_count u64, edge_count u64,
+             has_via u32, meta_len u32
+    meta     UTF-8 JSON, zero-padded to a multiple of 8 bytes
+    node_ids int64[node_count]      sorted building rowids
+    offsets  int64[node_count + 1]  start of each node's neighbours in targets/weights
+    targets  int64[edge_count]      neighbour rowids, sorted per node
+    weights  float64[edge_count]    edge distances
+    via      int64[edge_count]      only if has_via: contracted middle node, NO_VIA for none
+
+The crc32 covers everything after the header. The meta block records the database the file
+was built from (`source_db`). Readers reject files with a different magic, version, checksum
+or source database, and the backend falls back to loading the graph from the DB it queries.
+
+Usage:
+    python graph_snapshot.py                            # rewrite paths.snapshot from app.db
+    python graph_snapshot.py --db other.db -o other.snapshot
+"""
+import argparse
+import bisect
+import json
+import mmap
+import os
+import sqlite3
+import struct
+import zlib
+
+MAGIC = b'PITTGRPH'
+VERSION = 2
+HEADER = struct.Struct('<8sIIQQII')
+NO_VIA = -2 ** 63
+
+
+def get_db_path():
+    return os.path.join(os.path.dirname(__file__), 'app.db')
+
+
+def get_snapshot_path():
+    return os.path.join(os.path.dirname(__file__), 'paths.snapshot')
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def db_source(conn_or_path):
+    """Absolute path of the database file behind a connection (or path), as recorded in
+    and checked against a file's `source_db`."""
+    path = conn_or_path
+    if isinstance(conn_or_path, sqlite3.Connection):
+        path = next((r[2] for r in conn_or_path.execute('PRAGMA database_list') if r[1] == 'main'), '')
+    return os.path.realpath(path) if path else ''
+
+
+def read_paths_graph(conn):
+    """Build the adjacency dict from `paths`. This is the one loader used by routing,
+    the snapshot and the contraction hierarchy; for duplicate pairs the last row wins."""
+    graph = {}
+    for from_id, to_id, distance in conn.execute('SELECT from_building_id, to_building_id, distance FROM paths'):
+        try:
+            f = int(from_id)
+            t = int(to_id)
+            d = float(distance)
+        except Exception:
+            continue
+        graph.setdefault(f, {})[t] = d
+        graph.setdefault(t, {})[f] = d
+    return graph
+
+
+def write_snapshot(graph, path, via=None, meta=None):
+    """Serialise an adjacency dict to `path`. `via` maps (node, nbr) to the middle node of
+    a shortcut and adds the via section; `meta` is a small dict stored with the file.
+    The file is replaced atomically so processes that still map the old snapshot keep a
+    valid view of it."""
+    node_ids = sorted(graph)
+    offsets = [0]
+    targets = []
+    weights = []
+    vias = []
+    for n in node_ids:
+        for nbr, w in sorted(graph[n].items()):
+            targets.append(nbr)
+            weights.append(w)
+            if via is not None:
+                v = via.get((n, nbr))
+                vias.append(NO_VIA if v is None else v)
+        offsets.append(len(targets))
+
+    meta_bytes = json.dumps(meta or {}, sort_keys=True).encode('utf-8')
+    meta_bytes += b'\0' * (-len(meta_bytes) % 8)
+    sections = [
+        meta_bytes,
+        struct.pack(f'<{len(node_ids)}q', *node_ids),
+        struct.pack(f'<{len(offsets)}q', *offsets),
+        struct.pack(f'<{len(targets)}q', *targets),
+        struct.pack(f'<{len(weights)}d', *weights),
+    ]
+    if via is not None:
+        sections.append(struct.pack(f'<{len(vias)}q', *vias))
+    payload = b''.join(sections)
+    header = HEADER.pack(MAGIC, VERSION, zlib.crc32(payload), len(node_ids), len(targets),
+                         int(via is not None), len(meta_bytes))
+
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as fh:
+        fh.write(header)
+        fh.write(payload)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+    return len(node_ids), len(targets)
+
+
+def write_snapshot_from_db(conn, path=None):
+    return write_snapshot(read_paths_graph(conn), path or get_snapshot_path(), meta={'source_db': db_source(conn)})
+
+
+class SnapshotGraph:
+    """Read-only adjacency view over a mapped snapshot.
+
+    Supports the parts of the dict interface the routing code uses
+    (`get`, `in`, iteration, `len`); neighbour dicts are built per lookup
+    from the shared pages, nothing else is copied into the process.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._open()
+        except Exception:
+            self._mm.close()
+            raise
+        st = os.stat(path)
+        self.stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _open(self):
+        if len(self._mm) < HEADER.size:
+            raise SnapshotError('snapshot truncated')
+        magic, version, crc, n, m, has_via, meta_len = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise SnapshotError('not a graph snapshot')
+        if version != VERSION:
+            raise SnapshotError(f'snapshot version {version}, expected {VERSION}')
+        expected = HEADER.size + meta_len + 8 * (n + (n + 1) + m + m + (m if has_via else 0))
+        if meta_len % 8 or len(self._mm) != expected:
+            raise SnapshotError('snapshot size does not match header')
+
+        view = memoryview(self._mm)[HEADER.size:]
+        if zlib.crc32(view) != crc:
+            view.release()
+            raise SnapshotError('snapshot checksum mismatch')
+        self.meta = json.loads(bytes(view[:meta_len]).rstrip(b'\0') or b'{}')
+
+        def section(start, count, fmt):
+            start = meta_len + start * 8
+            return view[start:start + count * 8].cast(fmt)
+
+        self._view = view
+        self._nodes = section(0, n, 'q')
+        self._offsets = section(n, n + 1, 'q')
+        self._targets = section(2 * n + 1, m, 'q')
+        self._weights = section(2 * n + 1 + m, m, 'd')
+        self._via = section(2 * n + 1 + 2 * m, m, 'q') if has_via else None
+        self.edge_count = m
+
+    def _index(self, node):
+        i = bisect.bisect_left(self._nodes, node)
+        if i < len(self._nodes) and self._nodes[i] == node:
+            return i
+        return None
+
+    def get(self, node, default=None):
+        i = self._index(node)
+        if i is None:
+            return default
+        lo, hi = self._offsets[i], self._offsets[i + 1]
+        return dict(zip(self._targets[lo:hi], self._weights[lo:hi]))
+
+    def via(self, node, nbr):
+        """Middle node of the shortcut node -> nbr, None for an original edge.
+        Raises KeyError if there is no such edge or the file has no via section."""
+        i = self._index(node)
+        if i is None or self._via is None:
+            raise KeyError((node, nbr))
+        lo, hi = self._offsets[i], self._offsets[i + 1]
+        j = bisect.bisect_left(self._targets, nbr, lo, hi)
+        if j == hi or self._targets[j] != nbr:
+            raise KeyError((node, nbr))
+        v = self._via[j]
+        return None if v == NO_VIA else v
+
+    def __getitem__(self, node):
+        nbrs = self.get(node)
+        if nbrs is None:
+            raise KeyError(node)
+        return nbrs
+
+    def __contains__(self, node):
+        return isinstance(node, int) and self._index(node) is not None
+
+    def __iter__(self):
+        return iter(self._nodes)
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def items(self):
+        for node in self._nodes:
+            yield node, self.get(node)
+
+    def close(self):
+        for mv in (self._nodes, self._offsets, self._targets, self._weights, self._via, self._view):
+            if mv is not None:
+                mv.release()
+        self._mm.close()
+
+
+def load_snapshot(path=None, source_db=None):
+    """Map the snapshot at `path`. Returns (graph, error); graph is None if the file
+    is missing, from another format version, fails its checksum or, when `source_db`
+    is given, was built from a different database."""
+    path = path or get_snapshot_path()
+    if not os.path.exists(path):
+        return None, 'snapshot not found'
+    try:
+        graph = SnapshotGraph(path)
+    except (OSError, ValueError, SnapshotError) as e:
+        return None, str(e)
+    if source_db is not None and graph.meta.get('source_db') != source_db:
+        graph.close()
+        return None, f'{path} was built from {graph.meta.get("source_db") or "an unknown database"}, not {source_db}'
+    return graph, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write the binary graph snapshot of the `paths` table.')
+    parser.add_argument('--db', default=get_db_path(), help='SQLite database (default: app.db next to this script)')
+    parser.add_argument('-o', '--output', default=get_snapshot_path(), help='snapshot file (default: paths.snapshot)')
+    args = parser.parse_args()
+
+    db = args.db
+    if not os.path.exists(db):
+        print('Database not found:', db)
+        return
+    conn = sqlite3.connect(db)
+    cur = conn.cursor()
+    cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='paths'")
+    if not cur.fetchone():
+        print('paths table not found. Nothing to snapshot.')
+        conn.close()
+        return
+    path = args.output
+    nodes, edges = write_snapshot_from_db(conn, path)
+    conn.close()
+    print(f'Wrote snapshot with {nodes} nodes and {edges} edges to {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,53 +1,344 @@
 #!/usr/bin/env python3
-import sqlite3, os, json
-p = os.path.join(os.path.dirname(__file__), 'app.db')
-print('db path:', p, 'exists=', os.path.exists(p))
-if not os.path.exists(p):
-    print(json.dumps({'error': 'db_not_found', 'path': p}))
-    raise SystemExit(1)
-conn = sqlite3.connect(p)
-cur = conn.cursor()
-cur.execute("SELECT name FROM sqlite_master WHERE type='table'")
-tables = [r[0] for r in cur.fetchall()]
-summary = {'tables': tables}
-# buildings count and null coords
-if 'buildings' in tables:
+"""
+Inspect the backend database and report on query performance as JSON.
+
+Besides table counts and samples, the report contains for every SQL statement the backend
+issues its `EXPLAIN QUERY PLAN`, any full table scans, and measured latency; table and
+index sizes from `dbstat`; and recommended indexes.
+
+Recommendations come from the plans: a SCAN of a table the statement filters or joins on
+(by a parameter, literal or a table earlier in the loop), or a SEARCH through an automatic
+index SQLite rebuilds per query. Scans of tables a statement reads in full are reported
+but not flagged. If the plans show no avoidable scans, nothing is recommended.
+
+Usage:
+    python inspect_db.py                    # print the report
+    python inspect_db.py --runs 20          # more latency samples per query
+    python inspect_db.py --apply-indexes    # also create the recommended indexes
+
+The output is stable JSON (sorted keys) so reports can be diffed between releases.
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import statistics
+import time
+
+# Statements issued by app.py, routing.py and clustering.py.
+# params are filled in by query_params() from the data in the database.
+QUERIES = [
+    ('buildings_scan', 'api_buildings', 'SELECT rowid as id, * FROM buildings', 'none'),
+    ('events_scan', 'api_events', 'SELECT * FROM events', 'none'),
+    ('events_building_coords', 'api_events',
+     'SELECT latitude, longitude FROM buildings WHERE rowid = ?', 'building'),
+    ('events_join', 'clustering.build_cluster_index', '''
+        SELECT e.id, COALESCE(e.latitude, b.latitude), COALESCE(e.longitude, b.longitude)
+        FROM events e LEFT JOIN buildings b ON b.rowid = e.building_rowid
+    ''', 'none'),
+    ('events_signature_seq', 'app.events_signature',
+     "SELECT seq FROM sqlite_sequence WHERE name='events'", 'none'),
+    ('events_signature_count', 'app.events_signature', 'SELECT count(*) FROM events', 'none'),
+    ('events_delete', 'api_delete_event', 'DELETE FROM events WHERE id = ?', 'missing_event'),
+    ('pathfind_buildings', 'api_pathfind',
+     'SELECT rowid as id, * FROM buildings WHERE rowid IN (?, ?, ?, ?, ?)', 'buildings5'),
+    ('pathfind_coords', 'api_pathfind',
+     'SELECT rowid, latitude, longitude FROM buildings WHERE rowid IN (?, ?, ?, ?, ?)', 'buildings5'),
+    ('paths_load', 'routing.load_graph_from_db',
+     'SELECT from_building_id, to_building_id, distance FROM paths', 'none'),
+    ('ch_edges_load', 'ContractionHierarchy.load',
+     'SELECT from_id, to_id, distance, via_id FROM ch_edges', 'none'),
+    ('ch_version', 'contraction_hierarchy.ch_version',
+     "SELECT value FROM ch_meta WHERE key = 'built_at'", 'none'),
+]
+
+# Scans that look avoidable from the SQL but are not. Keep this short; every entry needs a reason.
+EXPECTED_SCANS = {
+    # sqlite_sequence is SQLite's internal one-row-per-table bookkeeping; it cannot be indexed
+    'events_signature_seq',
+}
+
+# FROM/JOIN <table> [AS] [alias]
+TABLE_REF = re.compile(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.I)
+# <operand> <op> <operand>, where an operand is a column, a parameter, a literal or a list
+COMPARISON = re.compile(
+    r"((?:\w+\.)?\w+|\?|'[^']*')\s*(=|<=|>=|<|>|\bIN\b)\s*((?:\w+\.)?\w+|\?|'[^']*'|\()", re.I)
+SQL_KEYWORDS = {'where', 'left', 'right', 'inner', 'outer', 'cross', 'natural', 'join', 'on',
+                'group', 'order', 'limit', 'using'}
+ROWID_NAMES = {'rowid', 'oid', '_rowid_'}
+
+def get_db_path():
+    return os.path.join(os.path.dirname(__file__), 'app.db')
+
+
+def table_names(conn):
+    return [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+
+
+def summarize(conn, tables):
+    """Counts, samples and rowid ranges for buildings and paths."""
+    cur = conn.cursor()
+    summary = {'tables': tables}
+    # buildings count and null coords
+    if 'buildings' in tables:
+        try:
+            cur.execute('SELECT count(*) FROM buildings')
+            summary['buildings_count'] = cur.fetchone()[0]
+            cur.execute('SELECT count(*) FROM buildings WHERE latitude IS NULL OR longitude IS NULL')
+            summary['buildings_null_coords'] = cur.fetchone()[0]
+            cur.execute("SELECT rowid, Building_Name, latitude, longitude FROM buildings LIMIT 5")
+            summary['buildings_sample'] = []
+            for r in cur.fetchall():
+                summary['buildings_sample'].append({'rowid': r[0], 'name': r[1], 'latitude': r[2], 'longitude': r[3]})
+        except Exception as e:
+            summary['buildings_error'] = str(e)
+    # paths info
+    if 'paths' in tables:
+        try:
+            cur.execute('SELECT count(*) FROM paths')
+            summary['paths_count'] = cur.fetchone()[0]
+            cur.execute('SELECT from_building_id, to_building_id, distance FROM paths LIMIT 5')
+            summary['paths_sample'] = []
+            for r in cur.fetchall():
+                summary['paths_sample'].append({'from_id': r[0], 'to_id': r[1], 'distance': r[2]})
+        except Exception as e:
+            summary['paths_error'] = str(e)
+    # check foreign id ranges if paths exist
+    if 'paths' in tables and 'buildings' in tables:
+        try:
+            cur.execute('SELECT min(rowid), max(rowid) FROM buildings')
+            mn, mx = cur.fetchone()
+            summary['buildings_rowid_min'] = mn
+            summary['buildings_rowid_max'] = mx
+            cur.execute('SELECT min(from_building_id), max(from_building_id), min(to_building_id), max(to_building_id) FROM paths')
+            pmin_from, pmax_from, pmin_to, pmax_to = cur.fetchone()
+            summary['paths_from_min'] = pmin_from
+            summary['paths_from_max'] = pmax_from
+            summary['paths_to_min'] = pmin_to
+            summary['paths_to_max'] = pmax_to
+        except Exception as e:
+            summary['paths_ranges_error'] = str(e)
+    if 'events' in tables:
+        try:
+            summary['events_count'] = conn.execute('SELECT count(*) FROM events').fetchone()[0]
+        except Exception as e:
+            summary['events_error'] = str(e)
+    return summary
+
+
+def query_params(conn, kind):
+    if kind == 'none':
+        return ()
+    if kind == 'missing_event':
+        # an id past the end, so measuring the DELETE removes nothing
+        return (2 ** 62,)
     try:
-        cur.execute('SELECT count(*) FROM buildings')
-        summary['buildings_count'] = cur.fetchone()[0]
-        cur.execute('SELECT count(*) FROM buildings WHERE latitude IS NULL OR longitude IS NULL')
-        summary['buildings_null_coords'] = cur.fetchone()[0]
-        cur.execute("SELECT rowid, Building_Name, latitude, longitude FROM buildings LIMIT 5")
-        summary['buildings_sample'] = []
-        for r in cur.fetchall():
-            summary['buildings_sample'].append({'rowid': r[0], 'name': r[1], 'latitude': r[2], 'longitude': r[3]})
-    except Exception as e:
-        summary['buildings_error'] = str(e)
-# paths info
-if 'paths' in tables:
+        ids = [r[0] for r in conn.execute('SELECT rowid FROM buildings LIMIT 5')]
+    except sqlite3.OperationalError:
+        ids = []
+    ids += [0] * (5 - len(ids))
+    return tuple(ids[:1]) if kind == 'building' else tuple(ids)
+
+
+def table_aliases(sql):
+    """Map every table name and alias in FROM/JOIN clauses to its table."""
+    aliases = {}
+    for table, alias in TABLE_REF.findall(sql):
+        aliases[table] = table
+        if alias and alias.lower() not in SQL_KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+
+def column_ref(operand, aliases):
+    """(table, column) for a column operand, None for parameters and literals."""
+    if '.' in operand:
+        alias, col = operand.split('.', 1)
+        return (aliases[alias], col) if alias in aliases else None
+    if operand[0].isalpha() or operand[0] == '_':
+        tables = set(aliases.values())
+        if len(tables) == 1:
+            return tables.pop(), operand
+    return None
+
+
+def constraints(sql, aliases):
+    """Columns compared in the statement: (column_ref, other_side) pairs where
+    other_side is another column_ref for joins and None for parameters/literals."""
+    out = []
+    for left, _, right in COMPARISON.findall(sql):
+        lref = column_ref(left, aliases)
+        rref = column_ref(right, aliases) if right != '(' else None
+        if lref:
+            out.append((lref, rref))
+        if rref:
+            out.append((rref, lref))
+    return out
+
+
+def parse_step(step, aliases):
+    """(kind, table, detail) for a SCAN/SEARCH plan step, None for anything else.
+    Handles "SCAN t" (newer sqlite) and "SCAN TABLE t" (older)."""
+    words = step.split()
+    if len(words) < 2 or words[0] not in ('SCAN', 'SEARCH'):
+        return None
+    i = 2 if words[1] == 'TABLE' and len(words) > 2 else 1
+    name = words[i]
+    return words[0], aliases.get(name, name), ' '.join(words[i + 1:])
+
+
+def plan_advice(name, sql, plan):
+    """Walk the plan in loop order. A SCAN of a table the statement filters or joins on
+    by an already-known value, or a SEARCH through an automatic (per-query) index, means a
+    persistent index would help. Returns (full_scans, avoidable, advice)."""
+    aliases = table_aliases(sql)
+    compared = constraints(sql, aliases)
+    seen = set()
+    full_scans, avoidable, advice = [], [], []
+    for step in plan:
+        parsed = parse_step(step, aliases)
+        if not parsed:
+            continue
+        kind, table, detail = parsed
+        if kind == 'SCAN' and 'COVERING INDEX' not in detail:
+            full_scans.append(table)
+            # a join column only narrows this table if the other side is bound by an outer loop
+            cols = []
+            for (t, col), other in compared:
+                if t == table and (other is None or other[0] in seen) and col not in cols:
+                    cols.append(col)
+            if cols and name not in EXPECTED_SCANS:
+                avoidable.append(table)
+                advice.append((table, cols, f'{step}: filters on {", ".join(cols)} without an index'))
+        elif kind == 'SEARCH' and 'AUTOMATIC' in detail:
+            m = re.search(r'\((.*)\)', detail)
+            cols = [c.split('=')[0].strip() for c in m.group(1).split(' AND ')] if m else []
+            if cols:
+                advice.append((table, cols, f'{step}: SQLite builds a temporary index on every run'))
+        seen.add(table)
+    return full_scans, avoidable, advice
+
+
+def analyze_query(conn, name, source, sql, params, runs):
+    sql = ' '.join(sql.split())
+    report = {'source': source, 'sql': sql}
     try:
-        cur.execute('SELECT count(*) FROM paths')
-        summary['paths_count'] = cur.fetchone()[0]
-        cur.execute('SELECT from_building_id, to_building_id, distance FROM paths LIMIT 5')
-        summary['paths_sample'] = []
-        for r in cur.fetchall():
-            summary['paths_sample'].append({'from_id': r[0], 'to_id': r[1], 'distance': r[2]})
-    except Exception as e:
-        summary['paths_error'] = str(e)
-# check foreign id ranges if paths exist
-if 'paths' in tables and 'buildings' in tables:
+        plan = [r[3] for r in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+    except sqlite3.OperationalError as e:
+        report['error'] = str(e)
+        return report, []
+    report['plan'] = plan
+    full_scans, avoidable, advice = plan_advice(name, sql, plan)
+    report['full_scans'] = full_scans
+    # full scans of tables the statement reads in full are the point of the query
+    report['avoidable_scans'] = avoidable
+
+    timings = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        timings.append((time.perf_counter() - t0) * 1000)
+    # the measured DELETE touches nothing, but don't leave a transaction open
+    conn.rollback()
+    report['latency_ms'] = {
+        'min': round(min(timings), 4),
+        'median': round(statistics.median(timings), 4),
+        'max': round(max(timings), 4),
+    }
+    return report, advice
+
+
+def analyze_queries(conn, runs):
+    queries, advice = {}, []
+    for name, source, sql, kind in QUERIES:
+        queries[name], found = analyze_query(conn, name, source, sql, query_params(conn, kind), runs)
+        advice += [(name,) + a for a in found]
+    return queries, advice
+
+
+def object_sizes(conn):
+    """Bytes and pages per table and index from the dbstat virtual table."""
     try:
-        cur.execute('SELECT min(rowid), max(rowid) FROM buildings')
-        mn, mx = cur.fetchone()
-        summary['buildings_rowid_min'] = mn
-        summary['buildings_rowid_max'] = mx
-        cur.execute('SELECT min(from_building_id), max(from_building_id), min(to_building_id), max(to_building_id) FROM paths')
-        pmin_from, pmax_from, pmin_to, pmax_to = cur.fetchone()
-        summary['paths_from_min'] = pmin_from
-        summary['paths_from_max'] = pmax_from
-        summary['paths_to_min'] = pmin_to
-        summary['paths_to_max'] = pmax_to
-    except Exception as e:
-        summary['paths_ranges_error'] = str(e)
-conn.close()
-print(json.dumps(summary, indent=2))
+        rows = conn.execute('''
+            SELECT s.name, m.type, m.tbl_name, sum(s.pgsize), count(*)
+            FROM dbstat s LEFT JOIN sqlite_master m ON m.name = s.name
+            GROUP BY s.name
+        ''').fetchall()
+    except sqlite3.OperationalError as e:
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+        return {'error': 'dbstat unavailable: ' + str(e), 'database_bytes': page_size * page_count}
+    sizes = {}
+    for name, kind, table, nbytes, pages in rows:
+        sizes[name] = {'type': kind or 'internal', 'table': table or name, 'bytes': nbytes, 'pages': pages}
+    return sizes
+
+
+def index_columns(conn, table):
+    """Columns of every index on `table`, keyed by index name."""
+    out = {}
+    for r in conn.execute(f'PRAGMA index_list("{table}")'):
+        cols = [c[2] for c in conn.execute(f'PRAGMA index_info("{r[1]}")')]
+        if cols:
+            out[r[1]] = cols
+    return out
+
+
+def recommend_indexes(conn, advice):
+    """One CREATE INDEX per distinct (table, columns) found in the plans, skipping
+    columns that are the rowid or already lead an index."""
+    recs = {}
+    for name, table, cols, reason in advice:
+        cols = [c for c in cols if c.lower() not in ROWID_NAMES]
+        if not cols or table.startswith('sqlite_'):
+            continue
+        existing = index_columns(conn, table).values()
+        if any(ix[:len(cols)] == cols for ix in existing):
+            continue
+        sql = f'CREATE INDEX IF NOT EXISTS idx_{table}_{"_".join(cols)} ON {table}({", ".join(cols)})'
+        rec = recs.setdefault(sql, {'table': table, 'columns': cols, 'sql': sql, 'queries': [], 'reasons': []})
+        rec['queries'].append(name)
+        rec['reasons'].append(reason)
+    return [recs[k] for k in sorted(recs)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect the backend database and report query performance as JSON.')
+    parser.add_argument('--db', default=get_db_path(), help='SQLite database (default: app.db next to this script)')
+    parser.add_argument('--runs', type=int, default=5, help='latency samples per query')
+    parser.add_argument('--apply-indexes', action='store_true', help='create the recommended indexes')
+    args = parser.parse_args()
+
+    p = args.db
+    if not os.path.exists(p):
+        print(json.dumps({'error': 'db_not_found', 'path': p}))
+        raise SystemExit(1)
+    conn = sqlite3.connect(p)
+    tables = table_names(conn)
+    report = {'db_path': p, 'sqlite_version': sqlite3.sqlite_version}
+    report['summary'] = summarize(conn, tables)
+
+    runs = max(1, args.runs)
+    queries, advice = analyze_queries(conn, runs)
+    recs = recommend_indexes(conn, advice)
+    for rec in recs:
+        rec['applied'] = False
+        if args.apply_indexes:
+            conn.execute(rec['sql'])
+            rec['applied'] = True
+    if args.apply_indexes and recs:
+        conn.execute('ANALYZE')
+        conn.commit()
+        # report the plans the new indexes produce
+        queries, _ = analyze_queries(conn, runs)
+    report['recommended_indexes'] = recs
+    report['queries'] = queries
+    report['avoidable_full_scans'] = sorted(name for name, q in queries.items() if q.get('avoidable_scans'))
+    report['sizes'] = object_sizes(conn)
+    conn.close()
+    print(json.dumps(report, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -9,13 +9,17 @@ Each id is the SQLite rowid from the `buildings` table. Distance should be a num
 Usage:
     python load_paths.py paths.csv
 
-This will create a `paths` table if it doesn't exist and insert rows.
+This will create a `paths` table if it doesn't exist, insert rows and rewrite the
+graph snapshot (`paths.snapshot`) the backend maps at startup.
 """
 import csv
 import sqlite3
 import sys
 import os
 
+from contraction_hierarchy import clear_contraction_hierarchy
+from graph_snapshot import write_snapshot_from_db
+
 
 def get_db_path():
     return os.path.join(os.path.dirname(__file__), 'app.db')
@@ -71,6 +75,14 @@ def main():
     cur.executemany('INSERT INTO paths(from_building_id, to_building_id, distance) VALUES (?, ?, ?)', rows)
     conn.commit()
     print(f'Inserted {len(rows)} path rows into {db}')
+
+    # Refresh the binary snapshot the backend maps at startup
+    nodes, snapshot_edges = write_snapshot_from_db(conn)
+    print(f'Wrote graph snapshot ({nodes} nodes, {snapshot_edges} edges)')
+
+    # The stored contraction hierarchy describes the old paths; drop it so it isn't used
+    clear_contraction_hierarchy(conn)
+    print('Cleared contraction hierarchy; run contraction_hierarchy.py to rebuild it')
     conn.close()
 
 
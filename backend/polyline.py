@@ -0,0 +1,102 @@
+"""
+Helpers for compact route geometry: Google encoded polylines, Douglas-Peucker
+simplification and cumulative distances along a route.
+
+Coordinates are (latitude, longitude) pairs in degrees; distances are meters.
+"""
+import math
+
+
+def _encode_value(value, out):
+    value = ~(value << 1) if value < 0 else value << 1
+    while value >= 0x20:
+        out.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    out.append(chr(value + 63))
+
+
+def encode_polyline(coords, precision=5):
+    """Encode coordinates with the Google polyline algorithm."""
+    factor = 10 ** precision
+    out = []
+    prev_lat = prev_lng = 0
+    for lat, lng in coords:
+        lat_i = int(round(lat * factor))
+        lng_i = int(round(lng * factor))
+        _encode_value(lat_i - prev_lat, out)
+        _encode_value(lng_i - prev_lng, out)
+        prev_lat, prev_lng = lat_i, lng_i
+    return ''.join(out)
+
+
+def decode_polyline(encoded, precision=5):
+    """Inverse of encode_polyline; returns a list of (lat, lng) tuples."""
+    factor = 10 ** precision
+    coords = []
+    index = lat = lng = 0
+    while index < len(encoded):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                b = ord(encoded[index]) - 63
+                index += 1
+                result |= (b & 0x1f) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        coords.append((lat / factor, lng / factor))
+    return coords
+
+
+def _to_meters(coords):
+    # local equirectangular projection; accurate enough at campus scale
+    lat0 = math.radians(coords[0][0])
+    k = 6371000 * math.pi / 180
+    return [(lng * k * math.cos(lat0), lat * k) for lat, lng in coords]
+
+
+def _segment_distance(p, a, b):
+    ax, ay = a
+    dx, dy = b[0] - ax, b[1] - ay
+    if dx == 0 and dy == 0:
+        return math.hypot(p[0] - ax, p[1] - ay)
+    t = max(0.0, min(1.0, ((p[0] - ax) * dx + (p[1] - ay) * dy) / (dx * dx + dy * dy)))
+    return math.hypot(p[0] - (ax + t * dx), p[1] - (ay + t * dy))
+
+
+def simplify(coords, tolerance):
+    """Douglas-Peucker simplification. Returns the indices of the points to keep;
+    every dropped point lies within `tolerance` meters of the simplified line.
+    """
+    if len(coords) < 3 or tolerance <= 0:
+        return list(range(len(coords)))
+    pts = _to_meters(coords)
+    keep = {0, len(pts) - 1}
+    stack = [(0, len(pts) - 1)]
+    while stack:
+        first, last = stack.pop()
+        best, index = 0.0, None
+        for i in range(first + 1, last):
+            d = _segment_distance(pts[i], pts[first], pts[last])
+            if d > best:
+                best, index = d, i
+        if index is not None and best > tolerance:
+            keep.add(index)
+            stack.append((first, index))
+            stack.append((index, last))
+    return sorted(keep)
+
+
+def cumulative_distances(edge_lengths):
+    """Distance in meters from the first vertex to each vertex, given the length of
+    each edge between consecutive vertices."""
+    out = [0.0]
+    total = 0.0
+    for length in edge_lengths:
+        total += length
+        out.append(round(total, 1))
+    return out
@@ -0,0 +1,174 @@
+"""
+Shortest-path routing over the `paths` graph, shared by the Flask app and batch_routes.py.
+
+Importing this module does no I/O. A Router loads what it needs on the first query:
+the contraction hierarchy (contraction_hierarchy.py) when one has been built, otherwise
+the memory-mapped graph snapshot (graph_snapshot.py), otherwise the `paths` table.
+The hierarchy is mapped from its file too, and only read from the ch_* tables when the
+file is missing or from another build. Both files record the database they were built
+from and are ignored when a Router queries a different one.
+"""
+import heapq
+import logging
+import os
+import sqlite3
+
+from contraction_hierarchy import ContractionHierarchy, ch_version
+from graph_snapshot import db_source, get_snapshot_path, load_snapshot, read_paths_graph
+
+logger = logging.getLogger(__name__)
+
+
+def get_db_path():
+    # Database lives in the backend folder
+    p = os.path.join(os.path.dirname(__file__), 'app.db')
+    if not os.path.exists(p):
+        return None
+    return p
+
+
+class RoutingError(Exception):
+    pass
+
+
+def load_graph_from_db(conn):
+    """Load graph data from a `paths` table in the DB.
+    Expects columns: from_building_id, to_building_id, distance
+    Returns graph as adjacency dict keyed by rowid ints.
+    """
+    cur = conn.cursor()
+    # Ensure paths table exists
+    cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='paths'")
+    if not cur.fetchone():
+        return None, 'paths table not found'
+    return read_paths_graph(conn), None
+
+
+def dijkstra_graph(graph, start, end):
+    # standard Dijkstra on graph keyed by node ids
+    queue = [(0, start, [start])]
+    visited = set()
+
+    while queue:
+        dist, node, path = heapq.heappop(queue)
+        if node == end:
+            return path, dist
+        if node in visited:
+            continue
+        visited.add(node)
+        for nbr, w in graph.get(node, {}).items():
+            if nbr not in visited:
+                heapq.heappush(queue, (dist + w, nbr, path + [nbr]))
+
+    return None, float('inf')
+
+
+class Router:
+    """Answers shortest-path queries, loading graph data lazily.
+
+    The hierarchy and snapshot are reloaded when they are rebuilt on disk. The plain
+    `paths` graph is read on every query unless `cache_graph` is set, which suits
+    batch jobs where the database does not change underneath them.
+    """
+
+    def __init__(self, db_path=None, snapshot_path=None, cache_graph=False, hierarchy_path=None):
+        self.db_path = db_path
+        self.snapshot_path = snapshot_path
+        self.hierarchy_path = hierarchy_path
+        self.cache_graph = cache_graph
+        self._ch = None
+        self._ch_version = None
+        self._snapshot = None
+        self._snapshot_stamp = None
+        self._db_graph = None
+
+    def connect(self):
+        db = self.db_path or get_db_path()
+        if not db:
+            raise RoutingError('Database not found.')
+        return sqlite3.connect(db)
+
+    def contraction_hierarchy(self, conn):
+        """Return the stored ContractionHierarchy, or None if it has not been built."""
+        version = ch_version(conn)
+        if version is None:
+            return None
+        if self._ch_version != version:
+            ch, err = ContractionHierarchy.load_file(version, db_source(conn), self.hierarchy_path)
+            if ch is None:
+                logger.warning('Ignoring hierarchy file, loading ch_edges from DB: %s', err)
+                ch = ContractionHierarchy.load(conn)
+            self._ch = ch
+            self._ch_version = version
+        return self._ch
+
+    def snapshot_graph(self):
+        """Return the mapped snapshot graph, remapping it if the file was rewritten.
+        Returns None when the snapshot is missing or unusable.
+        """
+        path = self.snapshot_path or get_snapshot_path()
+        try:
+            st = os.stat(path)
+            stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        except OSError:
+            stamp = None
+        if stamp != self._snapshot_stamp:
+            graph, err = load_snapshot(path, db_source(self.db_path or get_db_path() or '')) if stamp else (None, None)
+            if err:
+                logger.warning('Ignoring graph snapshot, loading paths from DB: %s', err)
+            self._snapshot = graph
+            self._snapshot_stamp = stamp
+        return self._snapshot
+
+    def preload(self):
+        """Map the snapshot and, when one is built, the hierarchy file ahead of the first query."""
+        self.snapshot_graph()
+        try:
+            conn = self.connect()
+        except RoutingError:
+            return
+        try:
+            self.contraction_hierarchy(conn)
+        finally:
+            conn.close()
+
+    def graph(self, conn):
+        graph = self.snapshot_graph()
+        if graph is not None:
+            return graph
+        if self._db_graph is not None:
+            return self._db_graph
+        graph, err = load_graph_from_db(conn)
+        if graph is None:
+            raise RoutingError('Path graph not available on server: ' + (err or ''))
+        if self.cache_graph:
+            self._db_graph = graph
+        return graph
+
+    def edge_lengths(self, path, conn):
+        """Weights of the edges between consecutive nodes of `path`, the same values that
+        add up to the distance shortest_path returned for it."""
+        ch = self.contraction_hierarchy(conn)
+        if ch is not None and all(n in ch for n in path):
+            # unpacked hierarchy paths only step along original edges
+            return [ch.edge_weight(a, b) for a, b in zip(path, path[1:])]
+        graph = self.graph(conn)
+        return [graph[a][b] for a, b in zip(path, path[1:])]
+
+    def shortest_path(self, start, end, conn=None):
+        """Return (node ids, distance), or (None, inf) when end is unreachable.
+        Raises RoutingError when there is no graph to search.
+        """
+        own_conn = conn is None
+        if own_conn:
+            conn = self.connect()
+        try:
+            # Prefer the precomputed hierarchy; fall back to a full Dijkstra
+            # when it hasn't been built for these nodes.
+            ch = self.contraction_hierarchy(conn)
+            if ch is not None and start in ch and end in ch:
+                return ch.query(start, end)
+            return dijkstra_graph(self.graph(conn), start, end)
+        finally:
+            if own_conn:
+                conn.close()
@@ -95,6 +95,8 @@ function setupEventListeners() {
     let currentRoutingControl = null;
     // Layer group for event markers (so we can toggle them)
     let eventsLayer = L.layerGroup().addTo(window.pittMap);
+    // Whether the user wants individual event markers; refreshClusters() decides if they fit the zoom
+    let eventsVisible = true;
     let eventsCache = [];
 
     // Event queue implementation (FIFO) with expiry support
@@ -300,6 +302,7 @@ function setupEventListeners() {
             const evs = await res.json();
             eventsCache = evs;
             renderEventMarkers(evs);
+            if (window.pittMap.getZoom() < CLUSTER_BELOW_ZOOM) refreshClusters();
         } catch (err) {
             console.warn('Could not load events:', err);
         }
@@ -649,6 +652,56 @@ function setupEventListeners() {
         loadBuildings();
     }
 
+    // Below this zoom, show server-side clusters (/api/clusters) instead of individual markers
+    const CLUSTER_BELOW_ZOOM = 15;
+    const clustersLayer = L.layerGroup();
+    let clustersRequest = 0;
+
+    async function refreshClusters() {
+        const map = window.pittMap;
+        if (map.getZoom() >= CLUSTER_BELOW_ZOOM) {
+            map.removeLayer(clustersLayer);
+            if (!eventsVisible) map.removeLayer(eventsLayer);
+            else if (!map.hasLayer(eventsLayer)) map.addLayer(eventsLayer);
+            return;
+        }
+        map.removeLayer(eventsLayer);
+        const b = map.getBounds();
+        const bbox = [b.getWest(), b.getSouth(), b.getEast(), b.getNorth()].join(',');
+        const requestId = ++clustersRequest;
+        try {
+            // hidden events are left out of the cluster counts too
+            const res = await fetch(`/api/clusters?zoom=${map.getZoom()}&bbox=${bbox}&events=${eventsVisible ? 1 : 0}`);
+            if (!res.ok) throw new Error('Failed to load clusters');
+            const data = await res.json();
+            // ignore responses that arrive after a newer pan/zoom
+            if (requestId !== clustersRequest || map.getZoom() >= CLUSTER_BELOW_ZOOM) return;
+            clustersLayer.clearLayers();
+            data.clusters.forEach(c => {
+                const size = 24 + Math.min(24, Math.round(Math.log2(c.count) * 4));
+                const icon = L.divIcon({
+                    className: 'cluster-marker',
+                    html: `<div style="width:${size}px;height:${size}px;line-height:${size}px;">${c.count}</div>`,
+                    iconSize: [size, size]
+                });
+                const m = L.marker([c.latitude, c.longitude], {
+                    icon: icon,
+                    title: `${c.buildings} buildings, ${c.events} events`
+                });
+                m.on('click', function() {
+                    map.setView([c.latitude, c.longitude], Math.min(data.zoom + 2, CLUSTER_BELOW_ZOOM));
+                });
+                clustersLayer.addLayer(m);
+            });
+            if (!map.hasLayer(clustersLayer)) map.addLayer(clustersLayer);
+        } catch (err) {
+            console.warn('Could not load clusters:', err);
+        }
+    }
+
+    window.pittMap.on('moveend', refreshClusters);
+    refreshClusters();
+
     // Load events on init
     loadEvents();
 
@@ -662,13 +715,13 @@ function setupEventListeners() {
     const toggleEventsButton = document.getElementById('toggle-events');
     if (toggleEventsButton) {
         toggleEventsButton.addEventListener('click', function() {
-            if (window.pittMap.hasLayer(eventsLayer)) {
-                window.pittMap.removeLayer(eventsLayer);
+            eventsVisible = !eventsVisible;
+            refreshClusters();
+            if (!eventsVisible) {
                 toggleEventsButton.textContent = 'Show Events';
                 toggleEventsButton.classList.remove('btn-danger');
                 toggleEventsButton.classList.add('btn-info');
             } else {
-                window.pittMap.addLayer(eventsLayer);
                 toggleEventsButton.textContent = 'Hide Events';
                 toggleEventsButton.classList.remove('btn-info');
                 toggleEventsButton.classList.add('btn-danger');